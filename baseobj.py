@@ -187,6 +187,7 @@ class BaseObj(object):
                      # listed part of the attributes of the current object
     _strfmt1  = None # String format for verbose level 1
     _strfmt2  = None # String format for verbose level 2
+    _strname  = None # Name to display instead of the packet layer name
     _globals  = {}   # Attributes share by all instances
 
     def __init__(self, *kwts, **kwds):
@@ -601,6 +602,17 @@ class BaseObj(object):
                 kwds.update(self._globals)
         return fstrobj.format(fmt, *kwts, **kwds)
 
+    def dprint_enabled(self, level):
+        """Return True if the given level is allowed by the verbose level
+           given in debug_level(), so the caller can skip building debug
+           messages which would not be displayed by dprint().
+        """
+        if level is None:
+            return False
+        if isinstance(level, str):
+            level = _debug_map[level.lower()]
+        return bool(level & _dlevel)
+
     def dprint(self, level, msg, indent=0):
         """Print debug message if level is allowed by the verbose level
            given in debug_level().
@@ -25,6 +25,7 @@ import time
 import binascii
 import nfstest_config as c
 from string import Formatter
+from functools import lru_cache
 
 # Module constants
 __author__    = "Jorge Mora (%s)" % c.NFSTEST_AUTHOR_EMAIL
@@ -186,6 +187,14 @@ def hexstr(value):
     """Convert string to its hex representation"""
     return "0x" + value.hex()
 
+@lru_cache(maxsize=1024)
+def _parse_format(format_string):
+    """Return the parsed format string as a tuple of
+       (literal_text, field_name, format_spec, conversion) items,
+       the result is cached so each format string is parsed just once
+    """
+    return tuple(Formatter.parse(None, format_string))
+
 class FormatStr(Formatter):
     """String Formatter object
 
@@ -310,6 +319,10 @@ class FormatStr(Formatter):
            out = x.format("{0:umax32}", alist)    # out = "[1, 2, 3, umax32]"
            out = x.format("{0:--:umax32}", alist) # out = "1--2--3--umax32"
     """
+    def parse(self, format_string):
+        """Override original method to parse each format string only once"""
+        return _parse_format(format_string)
+
     def format_field(self, value, format_spec):
         """Override original method to include modifier extensions"""
         if len(format_spec) > 1 and format_spec[0] == "?":
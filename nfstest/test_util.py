@@ -46,6 +46,7 @@ import os
 import re
 import sys
 import time
+import mmap
 import errno
 import fcntl
 import ctypes
@@ -54,6 +55,7 @@ import inspect
 import textwrap
 import traceback
 from formatstr import *
+from functools import lru_cache
 import nfstest_config as c
 from baseobj import BaseObj
 from nfstest.utils import *
@@ -108,6 +110,19 @@ _test_map_c = {
     IGNR: "    \033[33mIGNR\033[m: ",
 }
 
+# Format of struct flock used by lock_files()
+_LOCK_STRUCT = struct.Struct('hhllhh')
+
+@lru_cache(maxsize=256)
+def _errno_name(error):
+    """Return the symbolic name of the given error number"""
+    return str(errno.errorcode.get(error, error))
+
+@lru_cache(maxsize=256)
+def _strerror(error):
+    """Return the error message of the given error number"""
+    return os.strerror(error)
+
 _tverbose_map = {'group': 0, 'normal': 1, 'verbose': 2, '0':0, '1':1, '2':2}
 _rtverbose_map = dict(zip(_tverbose_map.values(),_tverbose_map))
 
@@ -204,7 +219,9 @@ class TestUtil(NFSUtil):
         self.bugmsgs = None
         self.nocleanup = True
         self.isatty = _isatty
-        self.test_time = [time.time()]
+        # Use monotonic clock (in nanoseconds) so time deltas are not
+        # affected by system clock adjustments
+        self.test_time = [time.monotonic_ns()]
         self._disp_time = 0
         self._disp_msgs = 0
         self._empty_msg = 0
@@ -306,7 +323,7 @@ class TestUtil(NFSUtil):
                     msg = "\033[32m" + msg + "\033[m" if self.isatty else msg
                 print(msg)
         if self._opts_done:
-            self.total_time = time.time() - self.test_time[0]
+            self.total_time = (time.monotonic_ns() - self.test_time[0]) / 1e9
             total_str = "\nTotal time: %s" % self._print_time(self.total_time)
             self.write_log(total_str)
             print(total_str)
@@ -447,6 +464,8 @@ class TestUtil(NFSUtil):
         self.file_opgroup.add_option("--iodelay", type="float", default=0.1, help=hmsg)
         hmsg = "Read/Write offset delta [default: %default]"
         self.file_opgroup.add_option("--offset-delta", default="4k", help=hmsg)
+        hmsg = "Use direct I/O when verifying file data"
+        self.file_opgroup.add_option("--direct-io", action="store_true", default=False, help=hmsg)
         self.opts.add_option_group(self.file_opgroup)
 
         self.path_opgroup = OptionGroup(self.opts, "Path options")
@@ -1600,9 +1619,9 @@ class TestUtil(NFSUtil):
         """
         if self._disp_time >= self._disp_msgs + self.dprint_count():
             return
-        self.test_time.append(time.time())
+        self.test_time.append(time.monotonic_ns())
         if self._opts_done and len(self.test_time) > 1:
-            ttime = self.test_time[-1] - self.test_time[-2]
+            ttime = (self.test_time[-1] - self.test_time[-2]) / 1e9
             self._test_msg(INFO, "TIME: %s" % self._print_time(ttime))
         self._disp_time = self._disp_msgs + self.dprint_count()
 
@@ -1725,7 +1744,23 @@ class TestUtil(NFSUtil):
                Data pattern to return, default is of the form:
                hex_offset(0x%08X) abcdefghijklmnopqrst\\n
         """
-        data = b''
+        data = bytearray(size)
+        self.data_pattern_into(data, offset, pattern)
+        return bytes(data)
+
+    def data_pattern_into(self, buffer, offset, pattern=None):
+        """Fill the given buffer in place with the data pattern.
+
+           buffer:
+               Writable buffer (e.g., bytearray) to fill, the size of
+               the data is given by the size of the buffer
+           offset:
+               Starting offset of pattern
+           pattern:
+               Data pattern to use [default: data_pattern default]
+        """
+        mview = memoryview(buffer)
+        size = len(mview)
         if pattern is None:
             pattern = b'abcdefghijklmnopqrst'
             line_len = 32
@@ -1734,19 +1769,20 @@ class TestUtil(NFSUtil):
             line_len = len(pattern)
             default = False
 
-        s_offset = offset % line_len
-        offset = offset - s_offset
-        N = int(0.9999 + (size + s_offset) / float(line_len))
-
-        for i in range(0,N):
+        # Position of the start of the current line relative to the buffer
+        pos = -(offset % line_len)
+        offset += pos
+        line = pattern
+        while pos < size:
             if default:
                 str_offset = b"0x%08X " % offset
                 plen = 31 - len(str_offset)
-                data += str_offset + pattern[:plen] + b'\n'
-                offset += line_len
-            else:
-                data += pattern
-        return data[s_offset:size+s_offset]
+                line = str_offset + pattern[:plen] + b'\n'
+            start = max(pos, 0)
+            end = min(pos + line_len, size)
+            mview[start:end] = line[start-pos:end-pos]
+            pos += line_len
+            offset += line_len
 
     def delay_io(self, delay=None):
         """Delay I/O by value given or the value given in --iodelay option."""
@@ -1993,19 +2029,66 @@ class TestUtil(NFSUtil):
         if nlen is not None:
             nargs['nlen'] = nlen
 
-        self.dprint('DBG2', "Open file [%s] for reading to validate data" % path)
-        fd = os.open(path, os.O_RDONLY)
+        fd = None
+        rbuffer = None
+        rsize = self.rsize
+        if self.direct_io:
+            # Bypass the client cache so the data verified is the data
+            # read from the server and not the data just written
+            rsize += (self.PAGESIZE - rsize) % self.PAGESIZE
+            self.dprint('DBG2', "Open file [%s] for reading to validate data (O_DIRECT)" % path)
+            try:
+                try:
+                    fd = os.open(path, os.O_RDONLY|os.O_DIRECT|os.O_NOATIME)
+                except OSError as e:
+                    if e.errno != errno.EPERM:
+                        raise
+                    # O_NOATIME is only allowed for the owner of the file,
+                    # still bypass the client cache without it
+                    fd = os.open(path, os.O_RDONLY|os.O_DIRECT)
+                # Anonymous mapping is page aligned as required by O_DIRECT
+                rbuffer = mmap.mmap(-1, rsize)
+            except OSError as e:
+                if e.errno != errno.EINVAL:
+                    raise
+                self.dprint('DBG2', "Unable to use direct I/O, using buffered I/O instead: %s" % e)
+                rsize = self.rsize
+        if fd is None:
+            self.dprint('DBG2', "Open file [%s] for reading to validate data" % path)
+            fd = os.open(path, os.O_RDONLY)
 
         try:
             offset = 0
             size = filesize
             while size > 0:
-                dsize = min(self.rsize, size)
+                dsize = min(rsize, size)
                 self.dprint('DBG5', "    Read file %d@%d" % (dsize, offset))
-                data = os.read(fd, dsize)
+                data = None
+                if rbuffer is not None:
+                    try:
+                        # Read whole aligned blocks into the aligned buffer
+                        count = os.readv(fd, [rbuffer])
+                        data = rbuffer[:min(count, dsize)]
+                    except OSError as e:
+                        if e.errno != errno.EINVAL:
+                            raise
+                        # File system does not support direct I/O,
+                        # clear O_DIRECT and use buffered I/O instead
+                        self.dprint('DBG2', "Unable to use direct I/O, using buffered I/O instead: %s" % e)
+                        flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+                        fcntl.fcntl(fd, fcntl.F_SETFL, flags & ~os.O_DIRECT)
+                        rbuffer.close()
+                        rbuffer = None
+                        rsize = self.rsize
+                        dsize = min(rsize, size)
+                if data is None:
+                    data = os.read(fd, dsize)
                 count = len(data)
                 if count > 0:
-                    doffset, mdata, edata = self.compare_data(data, offset, fd=fd, **nargs)
+                    # Unaligned reads are not allowed with O_DIRECT so do not
+                    # read the file to get the sample diff in that case
+                    dfd = fd if rbuffer is None else None
+                    doffset, mdata, edata = self.compare_data(data, offset, fd=dfd, **nargs)
                     if doffset is not None:
                         break
                 else:
@@ -2015,6 +2098,8 @@ class TestUtil(NFSUtil):
                 offset += count
         finally:
             os.close(fd)
+            if rbuffer is not None:
+                rbuffer.close()
 
         if msg is not None and len(msg):
             fmsg = ""
@@ -2039,6 +2124,8 @@ class TestUtil(NFSUtil):
         self.woffset = 0
         self.rfds = []
         self.wfds = []
+        self._rbuffer = None
+        self._wbuffer = None
 
     def open_files(self, mode, create=True):
         """Open files according to given mode, the file descriptors are saved
@@ -2058,6 +2145,9 @@ class TestUtil(NFSUtil):
                 fd = os.open(file, os.O_RDONLY)
                 self.rfds.append(fd)
                 self.lock_type = fcntl.F_RDLCK
+                if self._rbuffer is None:
+                    # Read buffer shared by all files, data is discarded
+                    self._rbuffer = bytearray(self.rsize)
             elif mode[0] == 'w':
                 if create:
                     self.get_filename()
@@ -2069,6 +2159,9 @@ class TestUtil(NFSUtil):
                 fd = os.open(file, os.O_WRONLY|os.O_CREAT|os.O_SYNC)
                 self.wfds.append(fd)
                 self.lock_type = fcntl.F_WRLCK
+                if self._wbuffer is None:
+                    # Write buffer shared by all files
+                    self._wbuffer = bytearray(self.wsize)
 
     def close_files(self, *fdlist):
         """Close all files opened by open_files() and all file descriptors
@@ -2089,19 +2182,35 @@ class TestUtil(NFSUtil):
         """Write a block of data (size given by --wsize) to all files opened
            by open_files() for writing.
         """
+        if self._wbuffer is None or len(self._wbuffer) != self.wsize:
+            self._wbuffer = bytearray(self.wsize)
+        # All files get the same data so build it just once in the
+        # write buffer which is reused on every call
+        self.data_pattern_into(self._wbuffer, self.woffset)
         for fd in self.wfds:
             self.dprint('DBG4', "Write file %d@%d" % (self.wsize, self.woffset))
-            os.write(fd, self.data_pattern(self.woffset, self.wsize))
+            os.write(fd, self._wbuffer)
         self.woffset += self.offset_delta
 
     def read_files(self):
         """Read a block of data (size given by --rsize) from all files opened
            by open_files() for reading.
         """
+        if not hasattr(os, "preadv"):
+            # Platform does not have preadv(), read at the given offset
+            # into a new buffer instead
+            for fd in self.rfds:
+                self.dprint('DBG4', "Read file %d@%d" % (self.rsize, self.roffset))
+                os.pread(fd, self.rsize, self.roffset)
+            self.roffset += self.offset_delta
+            return
+        if self._rbuffer is None or len(self._rbuffer) != self.rsize:
+            self._rbuffer = bytearray(self.rsize)
+        rbuffers = [self._rbuffer]
         for fd in self.rfds:
             self.dprint('DBG4', "Read file %d@%d" % (self.rsize, self.roffset))
-            os.lseek(fd, self.roffset, 0)
-            os.read(fd, self.rsize)
+            # Read at the given offset without seeking first
+            os.preadv(fd, rbuffers, self.roffset)
         self.roffset += self.offset_delta
 
     def lock_files(self, lock_type=None, offset=0, length=0):
@@ -2110,7 +2219,7 @@ class TestUtil(NFSUtil):
             lock_type = self.lock_type
         ret = []
         mode_str = 'WRITE' if lock_type == fcntl.F_WRLCK else 'READ'
-        lockdata = struct.pack('hhllhh', lock_type, 0, offset, length, 0, 0)
+        lockdata = _LOCK_STRUCT.pack(lock_type, 0, offset, length, 0, 0)
         for fd in self.rfds + self.wfds:
             try:
                 self.dprint('DBG3', "Lock file F_SETLKW (%s)" % mode_str)
@@ -2124,13 +2233,10 @@ class TestUtil(NFSUtil):
         """Return the formal string representation of the given list
            where string objects are truncated.
         """
-        alist = []
-        for item in args:
-            if isinstance(item, str) and len(item) > 16:
-                alist.append(repr(item[:16]+"..."))
-            else:
-                alist.append(repr(item))
-        return ", ".join(alist)
+        if not args:
+            return ""
+        return ", ".join(repr(item[:16]+"...") if isinstance(item, str) and len(item) > 16
+                         else repr(item) for item in args)
 
     def run_func(self, func, *args, **kwargs):
         """Run function with the given arguments and return the results.
@@ -2149,16 +2255,21 @@ class TestUtil(NFSUtil):
         error = 0
         result = None
         self.oserror = None
-        expestr = str(errno.errorcode.get(err,err))
-        fmsg = ", expecting %s but it succeeded" % expestr if err else ""
-        self.dprint('DBG4', "%s(%s)" % (func.__name__, self.str_args(args)))
+        if err:
+            expestr = _errno_name(err)
+            fmsg = ", expecting %s but it succeeded" % expestr
+        else:
+            fmsg = ""
+        if self.dprint_enabled('DBG4'):
+            # Format arguments only when the message is displayed
+            self.dprint('DBG4', "%s(%s)" % (func.__name__, self.str_args(args)))
         try:
             result = func(*args)
         except OSError as oserr:
             self.oserror = oserr
             error = oserr.errno
-            errstr = str(errno.errorcode.get(error,error))
-            strerr = os.strerror(error)
+            errstr = _errno_name(error)
+            strerr = _strerror(error)
             self.dprint('DBG4', "%s() got error [%s] %s" % (func.__name__, errstr, strerr))
             if err:
                 fmsg = ", expecting %s but got %s" % (expestr, errstr)
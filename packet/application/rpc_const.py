@@ -57,7 +57,7 @@ accept_stat = {
 }
 
 # reject_stat
-RPC_MISMATCH = 0, # RPC version number != 2
+RPC_MISMATCH = 0  # RPC version number != 2
 AUTH_ERROR   = 1  # remote can't authenticate caller
 reject_stat = {
     0: 'RPC_MISMATCH_ERR',
@@ -17,6 +17,7 @@ IPv6 module
 Decode IP version 6 layer.
 Extension headers are not supported.
 """
+import struct
 import nfstest_config as c
 from packet.transport.tcp import TCP
 from packet.transport.udp import UDP
@@ -29,6 +30,9 @@ __copyright__ = "Copyright (C) 2012 NetApp, Inc."
 __license__   = "GPL v2"
 __version__   = "1.1"
 
+# IPv6 header
+_IPV6_HDR = struct.Struct("!IHBB16s16s")
+
 class IPv6(IPv4):
     """IPv6 object
 
@@ -56,6 +60,9 @@ class IPv6(IPv4):
     # Class attributes
     _attrlist = ("version", "traffic_class", "flow_label", "total_size",
                  "protocol", "hop_limit", "src", "dst", "psize", "data")
+    # Store layer attributes in slots, any other attribute is still
+    # stored in the object's dictionary inherited from BaseObj
+    __slots__ = _attrlist + ("_pkt",)
 
     def __init__(self, pktt):
         """Constructor
@@ -67,15 +74,15 @@ class IPv6(IPv4):
                access to the parent layers.
         """
         unpack = pktt.unpack
-        ulist = unpack.unpack(40, "!IHBB16s16s")
+        ulist = unpack.unpack_struct(_IPV6_HDR)
         self.version       = (ulist[0] >> 28)
         self.traffic_class = (ulist[0] >> 20)&0xFF
         self.flow_label    = ulist[0]&0xFFF
         self.total_size    = ulist[1]
         self.protocol      = ulist[2]
         self.hop_limit     = ulist[3]
-        self.src           = IPv6Addr(ulist[4].hex())
-        self.dst           = IPv6Addr(ulist[5].hex())
+        self.src           = IPv6Addr.from_bytes(ulist[4])
+        self.dst           = IPv6Addr.from_bytes(ulist[5])
 
         pktt.pkt.add_layer("ip", self)
 
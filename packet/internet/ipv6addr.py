@@ -19,6 +19,7 @@ by a series of hexadecimal numbers or using the ":" notation. It provides
 a mechanism for comparing this object with a regular string. It also takes
 care of '::' notation and leading zeroes.
 """
+import socket
 import nfstest_config as c
 
 # Module constants
@@ -122,6 +123,16 @@ class IPv6Addr(str):
         """
         return super(IPv6Addr, cls).__new__(cls, IPv6Addr._convert(ip))
 
+    @classmethod
+    def from_bytes(cls, data):
+        """Create new instance from the raw 16-byte IPv6 address given."""
+        ip = socket.inet_ntop(socket.AF_INET6, data)
+        if ip.find('.') >= 0:
+            # IPv4-mapped or IPv4-compatible address is given in the
+            # dotted decimal notation, convert it to hex notation
+            ip = IPv6Addr._convert(data.hex())
+        return super(IPv6Addr, cls).__new__(cls, ip)
+
     def __eq__(self, other):
         """Compare two IPv6 addresses and return True if both are equal."""
         return str(self) == self._convert(other)
@@ -135,7 +146,7 @@ if __name__ == '__main__':
     ip = IPv6Addr('fe80000000000000020c29fffe5409ef')
     ipstr = "%s" % ip
     iprpr = "%r" % ip
-    ntests = 22
+    ntests = 25
 
     tcount = 0
     if ip == 0xFE80000000000000020C29FFFE5409EF:
@@ -189,6 +200,16 @@ if __name__ == '__main__':
     if IPv6Addr("1:0:0:2:0:0:0:0") == "1:0:0:2::":
         tcount += 1
 
+    ip = IPv6Addr.from_bytes(bytes.fromhex('fe80000000000000020c29fffe5409ef'))
+    if str(ip) == 'fe80::20c:29ff:fe54:9ef':
+        tcount += 1
+    ip = IPv6Addr.from_bytes(bytes.fromhex('00000000000000000000ffffc0000280'))
+    if str(ip) == '::ffff:c000:280':
+        tcount += 1
+    ip = IPv6Addr.from_bytes(bytes.fromhex('00000000000000000000000000000001'))
+    if str(ip) == '::1':
+        tcount += 1
+
     if tcount == ntests:
         print("All tests passed!")
         exit(0)
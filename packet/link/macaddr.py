@@ -56,6 +56,20 @@ class MacAddr(str):
         """
         return super(MacAddr, cls).__new__(cls, MacAddr._convert(mac))
 
+    @classmethod
+    def from_bytes(cls, data):
+        """Create new instance from the raw bytes of a MAC address
+           without going through the hexadecimal string conversion.
+
+           data:
+               Raw MAC address
+        """
+        if len(data) == 6:
+            mac = data.hex(":")
+        else:
+            mac = data.hex()
+        return super(MacAddr, cls).__new__(cls, mac)
+
     def __eq__(self, other):
         """Compare two MAC addresses and return True if both are equal."""
         return str(self) == self._convert(other)
@@ -69,7 +83,7 @@ if __name__ == '__main__':
     mac = MacAddr('E4CE8F589FF4')
     macstr = "%s" % mac
     macrpr = "%r" % mac
-    ntests = 6
+    ntests = 8
 
     tcount = 0
     if mac == 'E4CE8F589FF4':
@@ -84,6 +98,10 @@ if __name__ == '__main__':
         tcount += 1
     if macrpr == "'e4:ce:8f:58:9f:f4'":
         tcount += 1
+    if MacAddr.from_bytes(bytes.fromhex('E4CE8F589FF4')) == mac:
+        tcount += 1
+    if "%s" % MacAddr.from_bytes(bytes.fromhex('E4CE8F589FF4')) == macstr:
+        tcount += 1
 
     if tcount == ntests:
         print("All tests passed!")
@@ -16,6 +16,7 @@ ERF module
 
 Decode Linux "cooked" v2 capture encapsulation layer
 """
+import struct
 import nfstest_config as c
 from baseobj import BaseObj
 from packet.internet.ipv4 import IPv4
@@ -28,6 +29,9 @@ __copyright__ = "Copyright (C) 2022 NetApp, Inc."
 __license__   = "GPL v2"
 __version__   = "1.0"
 
+# Linux cooked v2 header
+_SLL_HDR = struct.Struct("!HHIHBB8s")
+
 class SLLv2(BaseObj):
     """Extensible record format object
 
@@ -50,6 +54,9 @@ class SLLv2(BaseObj):
     """
     # Class attributes
     _attrlist = ("etype", "index", "dtype", "ptype", "alen", "saddr", "psize")
+    # Store layer attributes in slots, any other attribute is still
+    # stored in the object's dictionary inherited from BaseObj
+    __slots__ = _attrlist + ("_pkt",)
 
     def __init__(self, pktt):
         """Constructor
@@ -61,7 +68,7 @@ class SLLv2(BaseObj):
                access to the parent layers.
         """
         unpack = pktt.unpack
-        ulist = unpack.unpack(20, "!HHIHBB8s")
+        ulist = unpack.unpack_struct(_SLL_HDR)
         self.etype = ulist[0]
         self.index = ulist[2]
         self.dtype = ulist[3]
@@ -71,7 +78,7 @@ class SLLv2(BaseObj):
 
         if self.dtype == 1:
             # Ethernet device type
-            self.saddr = MacAddr(self.saddr.hex())
+            self.saddr = MacAddr.from_bytes(self.saddr)
 
         pktt.pkt.add_layer("sll", self)
         self.psize = unpack.size()
@@ -16,6 +16,8 @@ VLAN module
 
 Decode Virtual LAN IEEE 802.1Q/802.1ad layer
 """
+import sys
+import struct
 import nfstest_config as c
 from baseobj import BaseObj
 from packet.link.ethernet_const import *
@@ -26,6 +28,12 @@ __copyright__ = "Copyright (C) 2018 NetApp, Inc."
 __license__   = "GPL v2"
 __version__   = "1.0"
 
+# VLAN tag: TCI and payload type
+_VLAN_HDR = struct.Struct("!HH")
+# Packet layer names for stacked VLAN layers: vlan1, vlan2, ...
+# Names are interned like the literal names used for all other layers
+_VLAN_NAMES = tuple(sys.intern("vlan%d" % i) for i in range(9))
+
 def vlan_layers(pktt):
     """Get all nested (stacked VLANs or QinQ) VLAN layers
        A Packet layer attribute is created for each VLAN layer:
@@ -41,10 +49,13 @@ def vlan_layers(pktt):
         else:
             # Done with all VLAN layers, add them to the packet as:
             # vlan1, vlan2, ..., vlan
-            for i in range(len(vlan_list)):
-                pktt.pkt.add_layer("vlan"+str(i+1), vlan_list.pop(0))
+            layers = []
+            for i, item in enumerate(vlan_list, start=1):
+                name = _VLAN_NAMES[i] if i < len(_VLAN_NAMES) else "vlan%d" % i
+                layers.append((name, item))
             # Add last VLAN layer
-            pktt.pkt.add_layer("vlan", vlan)
+            layers.append(("vlan", vlan))
+            pktt.pkt.add_layers(layers)
             break
 
 class VLAN(BaseObj):
@@ -67,6 +78,9 @@ class VLAN(BaseObj):
     """
     # Class attributes
     _attrlist = ("pcp", "dei", "vid", "etype", "psize")
+    # Store layer attributes in slots, any other attribute is still
+    # stored in the object's dictionary inherited from BaseObj
+    __slots__ = _attrlist + ("_pkt",)
     _strname = "VLAN"
 
     def __init__(self, pktt):
@@ -79,11 +93,10 @@ class VLAN(BaseObj):
                access to the parent layers.
         """
         unpack = pktt.unpack
-        ulist = unpack.unpack(4, "!2H")
-        self.pcp   = ulist[0] >> 13
-        self.dei   = (ulist[0] >> 12) & 0x01
-        self.vid   = ulist[0] & 0x0FFF
-        self.etype = ulist[1]
+        tci, self.etype = unpack.unpack_struct(_VLAN_HDR)
+        self.pcp = tci >> 13
+        self.dei = (tci >> 12) & 0x01
+        self.vid = tci & 0x0FFF
         self.psize = unpack.size()
 
     def __str__(self):
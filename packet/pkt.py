@@ -51,10 +51,19 @@ PKT_layers = [
     'gssd', 'nfs', 'mount', 'portmap', 'nlm', 'gssc',
 ]
 # Required layers for debug_repr(1)
-_PKT_rlayers = {'record', 'ip', 'ib'}
+_PKT_rlayers = frozenset(['record', 'ip', 'ib'])
 # Do not display these layers for debug_repr(1)
-_PKT_nlayers = {'gssd', 'gssc'}
+_PKT_nlayers = frozenset(['gssd', 'gssc'])
+# Initial layers for every packet, shared by all new packets
+_INIT_LAYERS = ("record",)
+# Set of all layer names
+_PKT_layer_set = frozenset(PKT_layers)
 _maxlen = len(max(PKT_layers, key=len))
+# Line prefix for each layer name displayed by debug_repr(2)
+_LAYER_PREFIX = {x.upper(): "    %s:%s " % (x.upper(), " " * (_maxlen - len(x))) for x in PKT_layers}
+_DATA_PREFIX  = "    DATA:%s 0x" % (" " * (_maxlen - 4))
+# Number of data bytes converted to hex at a time
+_HEX_CHUNK = 65536
 
 class Pkt(BaseObj):
     """Packet object
@@ -70,11 +79,18 @@ class Pkt(BaseObj):
     """
     # Class attributes
     _attrlist = tuple(PKT_layers)
+    # Each layer is stored in its own slot, any other attribute is still
+    # stored in the object's dictionary inherited from BaseObj
+    __slots__ = _attrlist + ("_layers", "_layerset")
 
     # Do not use BaseObj constructor to have a little bit of
     # performance improvement
     def __init__(self):
-        self._layers = ["record"]
+        # Layers not added to the packet are not set, BaseObj returns
+        # None for any of them since all layers are listed in _attrlist
+        self._layers = _INIT_LAYERS
+        # Set of layer names for fast membership tests
+        self._layerset = set(_INIT_LAYERS)
 
     @property
     def is_truncated(self):
@@ -83,7 +99,9 @@ class Pkt(BaseObj):
     def __eq__(self, other):
         """Comparison method used to determine if object has a given layer"""
         if isinstance(other, str):
-            return getattr(self, other.lower(), None) is not None
+            if other not in _PKT_layer_set:
+                other = other.lower()
+            return other in self._layerset
         return False
 
     def __ne__(self, other):
@@ -113,63 +131,132 @@ class Pkt(BaseObj):
                 )'
         """
         rdebug = self.debug_repr()
-        if rdebug > 0:
-            out = "Pkt(\n" if rdebug == 2 else ''
-            index = 0
-            if rdebug == 1:
-                layer_list = [x for x in self._layers if x not in _PKT_nlayers]
-            else:
-                layer_list = self._layers
-            lastkey = len(layer_list) - 1
-            for key in layer_list:
+        if rdebug == 0:
+            # Generic object representation, same as BaseObj.__str__
+            # without going through str() and Pkt.__repr__
+            return object.__repr__(self)
+        elif rdebug == 1:
+            return self.summary()
+        elif rdebug == 2:
+            return "".join(self._str_lines())
+        elif rdebug > 2:
+            return ""
+        return BaseObj.__str__(self)
+
+    def _str_lines(self):
+        """Generator for the representation of the packet as displayed
+           when the verbose level set by debug_repr() is 2. The hex data
+           of the last layer is generated in chunks.
+        """
+        yield "Pkt(\n"
+        lastkey = len(self._layers) - 1
+        for index, key in enumerate(self._layers):
+            value = getattr(self, key, None)
+            if value is not None:
+                # Use object's name as layer name if it has one,
+                # BaseObj has a default of None for all layers
+                name = getattr(value, "_strname", None)
+                if name is None:
+                    name = key.upper()
+                prefix = _LAYER_PREFIX.get(name)
+                if prefix is None:
+                    prefix = "    %s:%s " % (name, " " * (_maxlen - len(name)))
+                yield prefix + str(value) + "\n"
+                if index == lastkey and key != "nfs":
+                    # Display any un-dissected bytes of the last layer
+                    data = getattr(value, "data", None)
+                    if data:
+                        yield _DATA_PREFIX
+                        mview = memoryview(data)
+                        for offset in range(0, len(mview), _HEX_CHUNK):
+                            yield mview[offset:offset+_HEX_CHUNK].hex()
+                        yield "\n"
+        yield ")\n"
+
+    def write(self, fh):
+        """Write the string representation of the packet to the given
+           file object. This is the same as fh.write(str(pkt)) but when
+           the verbose level is 2, each line is written as it is created
+           and the hex data of the last layer is written in chunks so
+           the whole representation is never created in memory.
+
+           fh:
+               File object opened for writing text
+        """
+        if self.debug_repr() == 2:
+            for line in self._str_lines():
+                fh.write(line)
+        else:
+            fh.write(str(self))
+
+    def summary(self):
+        """Return the single line summary of the packet as displayed when
+           the verbose level set by debug_repr() is 1. It contains the
+           record, the network layer and the last layer of the packet, or
+           the ethernet layer if there is no network layer. Each layer is
+           displayed according to the verbose level set by debug_repr().
+        """
+        layer_list = self._layers
+        if not _PKT_nlayers.isdisjoint(layer_list):
+            layer_list = [x for x in layer_list if x not in _PKT_nlayers]
+        # Only a few layers are displayed: the required layers,
+        # the last layer and the ethernet layer only if there is
+        # no network layer
+        emit = _PKT_rlayers.union(layer_list[-1:])
+        if not self.ip and not self.ib:
+            emit = emit.union(("ethernet",))
+        out = []
+        for key in layer_list:
+            if key in emit:
                 value = getattr(self, key, None)
                 if value is not None:
-                    if rdebug == 1 and (index == lastkey or key in _PKT_rlayers or \
-                      (not self.ip and not self.ib and key == "ethernet")):
-                        out += str(value)
-                    elif rdebug == 2:
-                        if getattr(value, "_strname", None) is not None:
-                            # Use object's name as layer name
-                            name = value._strname
-                        else:
-                            name = key.upper()
-                        sps = " " * (_maxlen - len(name))
-                        out += "    %s:%s %s\n" % (name, sps, str(value))
-                        if index == lastkey and getattr(value, "data", "") and key != "nfs":
-                            sps = " " * (_maxlen - 4)
-                            out += "    DATA:%s 0x%s\n" % (sps, value.data.hex())
-                index += 1
-            out += ")\n" if rdebug == 2 else ""
-        else:
-            out = BaseObj.__str__(self)
-        return out
+                    out.append(str(value))
+        return "".join(out)
 
     def __repr__(self):
         """Formal string representation of packet object"""
         rdebug = self.debug_repr()
         if rdebug > 0:
             sindent = self.sindent()
-            out = "Pkt(\n"
+            nlindent = "\n" + sindent
+            out = ["Pkt(\n"]
             # Display layers in the order in which they were added
             for key in self._layers:
                 layer = getattr(self, key, None)
                 if layer is not None:
-                    # Add indentation to every line in the
-                    # layer's representation
-                    value = repr(layer).replace("\n", "\n"+sindent)
-                    out += "%s%s = %s,\n" % (sindent, key, value)
-            out += ")\n"
-        else:
-            out = object.__repr__(self)
-        return out
+                    value = repr(layer)
+                    if "\n" in value:
+                        # Add indentation to every line in the
+                        # layer's representation
+                        value = value.replace("\n", nlindent)
+                    out.append("%s%s = %s,\n" % (sindent, key, value))
+            out.append(")\n")
+            return "".join(out)
+        return object.__repr__(self)
 
     def add_layer(self, name, layer):
         """Add layer to name and object to the packet"""
         layer._pkt = self
         setattr(self, name, layer)
-        self._layers.append(name)
+        self._layers += (name,)
+        self._layerset.add(name)
+
+    def add_layers(self, layers):
+        """Add a list of layers to the packet
+
+           layers:
+               List of (name, object) pairs in the order in which
+               the layers should be added
+        """
+        names = []
+        for name, layer in layers:
+            layer._pkt = self
+            setattr(self, name, layer)
+            names.append(name)
+        self._layers += tuple(names)
+        self._layerset.update(names)
 
     def get_layers(self):
         """Return the list of layers currently in the packet"""
-        # Return a tuple instead of the list so it cannot be modified
-        return tuple(self._layers)
+        # Layers are already kept in a tuple so it cannot be modified
+        return self._layers
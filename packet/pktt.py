@@ -43,10 +43,13 @@ import re
 import ast
 import sys
 import gzip
+import heapq
 import time
-import fcntl
+import mmap
+import queue
 import struct
-import termios
+import threading
+from functools import lru_cache
 from formatstr import *
 import nfstest_config as c
 from baseobj import BaseObj
@@ -74,13 +77,23 @@ BaseObj.debug_map(0x800000000, 'pkt4', "PKT4: ")
 BaseObj.debug_map(0xF00000000, 'pktt', "PKTT: ")
 
 # Map of items not in the array of the compound
-_nfsopmap = {'status', 'tag', 'minorversion'}
+_nfsopmap = frozenset(['status', 'tag', 'minorversion'])
 # Set of valid layers
-_pkt_layers = set(PKT_layers)
+_pkt_layers = frozenset(PKT_layers)
 
 # Read size -- the amount of data read at a time from the file
 # The read ahead buffer actual size is always >= 2*READ_SIZE
-READ_SIZE = 64*1024
+READ_SIZE = 256*1024
+# Buffer size used when opening the packet trace file
+OPEN_BUFFER_SIZE = 1024*1024
+# Minimum and maximum time to wait for more data on a live trace file,
+# the wait time is doubled every time no new data is available
+LIVE_WAIT_MIN = 0.01
+LIVE_WAIT_MAX = 1.0
+# Amount of data decompressed at a time from a compressed trace file
+GZIP_CHUNK_SIZE = 4*1024*1024
+# Maximum number of decompressed chunks waiting to be read
+GZIP_QUEUE_SIZE = 4
 
 # Show progress if stderr is a tty and stdout is not
 SHOWPROG = os.isatty(2) and not os.isatty(1)
@@ -151,38 +164,112 @@ precedence_d = {
 
 def get_op(op):
     """Return the string representation of the logical operator AST object"""
-    ret = oplogic_d.get(type(op))
-    if ret is None:
+    try:
+        return oplogic_d[type(op)]
+    except KeyError:
         raise Exception("Unknown logical operator class '%s'" % op)
-    return ret
 
 def get_binop(op):
     """Return the string representation of the operator AST object"""
-    ret = binop_d.get(type(op))
-    if ret is None:
+    try:
+        return binop_d[type(op)]
+    except KeyError:
         raise Exception("Unknown operator class '%s'" % op)
-    return ret
 
 def get_precedence(op):
     """Return the precedence of operator AST object"""
-    ret = precedence_d.get(type(op))
-    if ret is None:
+    try:
+        return precedence_d[type(op)]
+    except KeyError:
         raise Exception("Unknown operator class '%s'" % op)
-    return ret
 
 def get_bool(op):
     """Return the string representation of the logical operator AST object"""
-    ret = bool_d.get(type(op))
-    if ret is None:
+    try:
+        return bool_d[type(op)]
+    except KeyError:
         raise Exception("Unknown boolean operator class '%s'" % op)
-    return ret
 
 def get_unary(op):
     """Return the string representation of the unary operator AST object"""
-    ret = unary_d.get(type(op))
-    if ret is None:
+    try:
+        return unary_d[type(op)]
+    except KeyError:
         raise Exception("Unknown unary operator class '%s'" % op)
-    return ret
+
+def _unparse_tuple(tree):
+    """Return the string representation of a tuple AST object"""
+    tlist = [unparse(x) for x in tree.elts]
+    if len(tlist) <= 1:
+        # Empty or single item tuple must have a comma, e.g., (,) or ("item",)
+        tlist.append("")
+    return "(%s)" % ", ".join(tlist)
+
+def _unparse_compare(tree):
+    """Return the string representation of a comparison AST object"""
+    out = [unparse(tree.left)]
+    for op, comparator in zip(tree.ops, tree.comparators):
+        out.append(get_op(op))
+        out.append(unparse(comparator))
+    return "".join(out)
+
+def _unparse_boolop(tree):
+    """Return the string representation of a logical operation AST object"""
+    blist = []
+    for item in tree.values:
+        itemstr = unparse(item)
+        if type(item) is ast.BoolOp:
+            # Nested logical operations -- add parentheses
+            itemstr = "(%s)" % itemstr
+        blist.append(itemstr)
+    return get_bool(tree.op).join(blist)
+
+def _unparse_binop(tree):
+    """Return the string representation of a binary operation AST object"""
+    left  = tree.left
+    right = tree.right
+    lhs = unparse(left)
+    rhs = unparse(right)
+    precedence = get_precedence(tree.op)
+    if type(left) is ast.BinOp and \
+       ((type(tree.op) is ast.Pow and tree.op == left.op) or \
+       get_precedence(left.op) < precedence):
+        # Add parentheses on the LHS according to operation precedence
+        # or if both operations are '**' -- exponent operation has a
+        # right-to-left associativity as opposed to others operations
+        # which have a left-to-right associativity
+        lhs = "(%s)" % lhs
+    if type(right) is ast.BinOp and get_precedence(right.op) < precedence:
+        rhs = "(%s)" % rhs
+    return (lhs + get_binop(tree.op) + rhs)
+
+def _unparse_unaryop(tree):
+    """Return the string representation of a unary operation AST object"""
+    operand = unparse(tree.operand)
+    if type(tree.operand) in (ast.BinOp, ast.BoolOp) and \
+       get_precedence(tree.operand.op) < get_precedence(tree.op):
+        operand = "(%s)" % operand
+    return get_unary(tree.op) + operand
+
+# Function to unparse each of the supported AST object classes
+_UNPARSE_DISPATCH = {
+    ast.Name       : lambda tree: tree.id,
+    ast.Attribute  : lambda tree: unparse(tree.value) + "." + tree.attr,
+    ast.Constant   : lambda tree: repr(tree.value),
+    ast.Tuple      : _unparse_tuple,
+    ast.List       : lambda tree: "[%s]" % ", ".join([unparse(x) for x in tree.elts]),
+    ast.Call       : lambda tree: "%s(%s)" % (unparse(tree.func), ", ".join([unparse(x) for x in tree.args])),
+    ast.Expression : lambda tree: unparse(tree.body),
+    ast.Compare    : _unparse_compare,
+    ast.BoolOp     : _unparse_boolop,
+    ast.BinOp      : _unparse_binop,
+    ast.UnaryOp    : _unparse_unaryop,
+}
+if sys.version_info < (3, 8):
+    # Deprecated classes, only created by older Python releases
+    _UNPARSE_DISPATCH[ast.Num]   = lambda tree: repr(tree.n)
+    _UNPARSE_DISPATCH[ast.Str]   = lambda tree: repr(tree.s)
+    _UNPARSE_DISPATCH[ast.Bytes] = lambda tree: repr(tree.s)
 
 def unparse(tree):
     """Older Python releases do not define ast.unparse(). Create function
@@ -191,67 +278,9 @@ def unparse(tree):
        as ast.unparse(), so always use it regardless if it is defined or
        not on the ast module.
     """
-    if isinstance(tree, ast.Name):
-        return tree.id
-    elif isinstance(tree, ast.Attribute):
-        return unparse(tree.value) + "." + tree.attr
-    elif isinstance(tree, ast.Constant):
-        return repr(tree.value)
-    elif isinstance(tree, ast.Tuple):
-        tlist = [unparse(x) for x in tree.elts]
-        if len(tlist) <= 1:
-            # Empty or single item tuple must have a comma, e.g., (,) or ("item",)
-            tlist.append("")
-        return "(%s)" % ", ".join(tlist)
-    elif isinstance(tree, ast.List):
-        return "[%s]" % ", ".join([unparse(x) for x in tree.elts])
-    elif isinstance(tree, ast.Call):
-        return "%s(%s)" % (unparse(tree.func), ", ".join([unparse(x) for x in tree.args]))
-    elif isinstance(tree, ast.Num):   # Deprecated
-        return repr(tree.n)
-    elif isinstance(tree, ast.Str):   # Deprecated
-        return repr(tree.s)
-    elif isinstance(tree, ast.Bytes): # Deprecated
-        return repr(tree.s)
-    elif isinstance(tree, ast.Expression):
-        tree = tree.body
-
-    if isinstance(tree, ast.Compare):
-        left = unparse(tree.left)
-        ops = [get_op(x) for x in tree.ops]
-        comparators = [unparse(x) for x in tree.comparators]
-        ret = left + "".join([x+y for x,y in zip(ops, comparators)])
-        return ret
-    elif isinstance(tree, ast.BoolOp):
-        blist = []
-        for item in tree.values:
-            itemstr = unparse(item)
-            if isinstance(item, ast.BoolOp):
-                # Nested logical operations -- add parentheses
-                itemstr = "(%s)" % itemstr
-            blist.append(itemstr)
-        return get_bool(tree.op).join([x for x in blist])
-    elif isinstance(tree, ast.BinOp):
-        lhs = unparse(tree.left)
-        rhs = unparse(tree.right)
-        if isinstance(tree.left, ast.BinOp) and \
-           ((isinstance(tree.op, ast.Pow) and tree.op == tree.left.op) or \
-           get_precedence(tree.left.op) < get_precedence(tree.op)):
-            # Add parentheses on the LHS according to operation precedence
-            # or if both operations are '**' -- exponent operation has a
-            # right-to-left associativity as opposed to others operations
-            # which have a left-to-right associativity
-            lhs = "(%s)" % lhs
-        if isinstance(tree.right, ast.BinOp) and \
-           get_precedence(tree.right.op) < get_precedence(tree.op):
-            rhs = "(%s)" % rhs
-        return (lhs + get_binop(tree.op) + rhs)
-    elif isinstance(tree, ast.UnaryOp):
-        operand = unparse(tree.operand)
-        if isinstance(tree.operand, (ast.BinOp, ast.BoolOp)) and \
-           get_precedence(tree.operand.op) < get_precedence(tree.op):
-            operand = "(%s)" % operand
-        return get_unary(tree.op) + operand
+    func = _UNPARSE_DISPATCH.get(type(tree))
+    if func is not None:
+        return func(tree)
 
 def convert_attrs(tree):
     """Convert all valid layer AST Attributes to fully qualified names.
@@ -262,30 +291,336 @@ def convert_attrs(tree):
          attributes are expanded correctly.
     """
     name = None
+    # Use local variables for the global objects used in the loop
+    nfsopmap = _nfsopmap
+    pkt_layers = _pkt_layers
+    Attribute = ast.Attribute
+    Name = ast.Name
+    # Inner attributes of chains already processed, e.g., for attribute
+    # chain "tcp.flags.ACK" the inner attribute is "tcp.flags"
+    inner = set()
+    # The tree is walked breadth first so the outer attribute of each
+    # chain is always processed before its inner attributes
     for node in ast.walk(tree):
+        if type(node) is not Attribute or node in inner:
+            continue
+        # Get the attribute at the start of the chain
         curr = node
-        while isinstance(curr, ast.Attribute):
-            if isinstance(curr.value, ast.Name):
-                layer = curr.value.id.lower()
-                if layer == 'nfs' and curr.attr not in _nfsopmap:
-                    curr.value.id = layer
-                    name = 'match_nfs'
-                elif layer in _pkt_layers:
-                    # Add proper object prefix
-                    curr.value.id = 'self.pkt.' + layer
-                    if name is None:
-                        name = 'match_pkt'
-                break
-            curr = curr.value
+        value = curr.value
+        while type(value) is Attribute:
+            inner.add(value)
+            curr = value
+            value = curr.value
+        if type(value) is Name:
+            layer = value.id.lower()
+            if layer == 'nfs' and curr.attr not in nfsopmap:
+                value.id = layer
+                name = 'match_nfs'
+            elif layer in pkt_layers:
+                # Add proper object prefix
+                value.id = 'self.pkt.' + layer
+                if name is None:
+                    name = 'match_pkt'
     return name
 
+# Global namespace used by all match expressions
+_MATCH_GLOBALS = globals()
+
+@lru_cache(maxsize=1024)
+def _compile_func(expr, args):
+    """Return a function which evaluates the given string expression,
+       the function is cached so the same expression is compiled just once.
+       Calling the function is faster than calling eval() on the expression.
+
+       expr:
+           String expression returned by the function
+       args:
+           Comma separated names of the function arguments, these are
+           the only local names the expression can reference
+    """
+    # The expression is terminated by a new line in case it has a comment
+    code = compile("lambda %s: (%s\n)" % (args, expr), "<match>", "eval")
+    return eval(code, _MATCH_GLOBALS)
+
+# AST classes which may not evaluate all of their operands
+_LAZY_NODES = (ast.BoolOp, ast.IfExp, ast.Lambda, ast.ListComp,
+               ast.SetComp, ast.DictComp, ast.GeneratorExp)
+
+def _expr_layers(expr):
+    """Return the set of packet layers referenced by the given string
+       expression as given to match_pkt(), e.g., {"ip", "tcp"} for
+       expression "self.pkt.ip.src == '10.0.0.1' and self.pkt.tcp.dst_port == 2049".
+       The expression cannot be true if any of these layers is missing
+       from the packet since an exception is raised when evaluated.
+       Return None if the expression may be true without evaluating all
+       layers referenced, e.g., using logical operators.
+    """
+    try:
+        tree = ast.parse(expr, mode="eval")
+    except SyntaxError:
+        return None
+    layers = set()
+    for node in ast.walk(tree):
+        if isinstance(node, _LAZY_NODES) or \
+           (type(node) is ast.Compare and len(node.ops) > 1):
+            # Chained comparisons are evaluated lazily as well
+            return None
+        if type(node) is ast.Attribute:
+            # Look for an attribute of a layer, e.g., self.pkt.tcp.flags
+            value = node.value
+            if type(value) is ast.Attribute and \
+               type(value.value) is ast.Attribute and value.value.attr == "pkt" and \
+               type(value.value.value) is ast.Name and value.value.value.id == "self":
+                layers.add(value.attr)
+    return layers
+
+def _match_layers(tree):
+    """Return the set of packet layers needed by the converted match
+       expression tree returned by Pktt._convert_match(). The match
+       expression cannot be true for a packet missing any of these layers
+       since each of the wrapper functions match_pkt() and match_nfs()
+       returns False when the layers they need are missing.
+    """
+    if type(tree) is ast.Call and type(tree.func) is ast.Attribute and \
+       type(tree.func.value) is ast.Name and tree.func.value.id == "self":
+        if tree.func.attr == "match_nfs":
+            return {"nfs"}
+        elif tree.func.attr == "match_pkt" and len(tree.args) == 1 and \
+             type(tree.args[0]) is ast.Constant:
+            layers = _expr_layers(tree.args[0].value)
+            if layers:
+                return layers
+    elif type(tree) is ast.BoolOp:
+        lsets = [_match_layers(x) for x in tree.values]
+        if type(tree.op) is ast.And:
+            # All operands must be true
+            return set().union(*lsets)
+        else:
+            # Any operand could be true
+            return set.intersection(*lsets)
+    return set()
+
+@lru_cache(maxsize=1024)
+def _compile_pkt_func(expr):
+    """Return the function for the given string expression as given to
+       match_pkt(). The function returns False without evaluating the
+       expression when any of the packet layers it needs is missing,
+       instead of raising an exception for every packet not having
+       the layers.
+    """
+    layers = _expr_layers(expr)
+    if layers:
+        args = "self, _layers=frozenset(%r)" % sorted(layers)
+        return _compile_func("_layers <= self.pkt._layerset and (%s\n)" % expr, args)
+    return _compile_func(expr, "self")
+
+# Function to match an expression against all operations of an NFSv4
+# compound, the operation index is not incremented on a match
+_NFS_ARRAY_FUNC = """
+def match_array(self, array):
+    ret = False
+    idx = 0
+    for nfs in array:
+        try:
+            if (%s
+            ):
+                self._nfsop  = nfs
+                self._nfsidx = idx
+                ret = True
+                continue
+        except Exception:
+            # Continue searching on next operation
+            pass
+        idx += 1
+    return ret
+"""
+
+@lru_cache(maxsize=1024)
+def _compile_nfs_array(expr):
+    """Return a function which matches the given string expression
+       against all the operations of an NFSv4 compound, the function is
+       cached so the same expression is compiled just once. The loop
+       over the operations is part of the compiled function so there is
+       no function call for each operation.
+
+       expr:
+           String expression where the name nfs is the operation
+    """
+    namespace = {}
+    exec(compile(_NFS_ARRAY_FUNC % expr, "<match>", "exec"), _MATCH_GLOBALS, namespace)
+    return namespace["match_array"]
+
+def _raw_ip(pktt):
+    """Decode raw ip layer"""
+    unpack = pktt.unpack
+    uoffset = unpack.tell()
+    ipver = unpack.unpack_uchar() >> 4
+    unpack.seek(uoffset)
+    if ipver == 4:
+        # Decode IPv4 packet
+        IPv4(pktt)
+    elif ipver == 6:
+        # Decode IPv6 packet
+        IPv6(pktt)
+
+# Function or class to decode the link layer given by the link type
+_LINK_DECODERS = {
+    1   : ETHERNET, # Ethernet layer
+    101 : _raw_ip,  # Raw ip layer
+    113 : SLLv1,    # Linux "cooked" v1 capture encapsulation layer
+    197 : ERF,      # Extensible record format layer
+    276 : SLLv2,    # Linux "cooked" v2 capture encapsulation layer
+}
+
+class GzipReader(object):
+    """File object to read a gzip compressed file where the data is
+       decompressed by a background thread, so decompression runs
+       while the packets already read are being processed. The zlib
+       module releases the GIL while decompressing.
+
+       Only the methods needed by Pktt are supported: read(), seek(),
+       tell() and close().
+    """
+    def __init__(self, fileobj):
+        self.gzfh     = gzip.GzipFile(fileobj=fileobj)
+        self.position = 0     # Offset of next byte returned by read()
+        self.buffer   = b""   # Current decompressed chunk
+        self.boffset  = 0     # Offset of next byte in current chunk
+        self.eof      = False # All data has been decompressed
+        self.thread   = None  # Background decompression thread
+        self.queue    = None  # Queue of decompressed chunks
+        self.stopev   = None  # Event to stop the background thread
+        self.error    = None  # Decompression error not yet raised
+
+    def _prefetch(self, chunkq, stopev):
+        """Background thread: decompress data one chunk at a time"""
+        parts = []
+        try:
+            while not stopev.is_set():
+                # Use read1() so all data decompressed so far is kept
+                # if the stream is truncated or corrupted, read() would
+                # discard it when raising the exception
+                size = 0
+                while size < GZIP_CHUNK_SIZE:
+                    data = self.gzfh.read1(GZIP_CHUNK_SIZE - size)
+                    if not data:
+                        break
+                    parts.append(data)
+                    size += len(data)
+                data = b"".join(parts)
+                parts = []
+                chunkq.put(data)
+                if not data:
+                    break
+        except Exception as error:
+            if parts:
+                # Queue all data decompressed before the error
+                chunkq.put(b"".join(parts))
+            chunkq.put(error)
+
+    def _stop(self):
+        """Stop background thread and discard all decompressed data"""
+        if self.thread is not None:
+            self.stopev.set()
+            while self.thread.is_alive():
+                # Unblock the thread if it is waiting on a full queue
+                try:
+                    self.queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            self.thread.join()
+            self.thread = None
+        self.buffer  = b""
+        self.boffset = 0
+
+    def _next_chunk(self):
+        """Return next decompressed chunk, empty on end of file"""
+        if self.error is not None:
+            # Raise the error deferred by read()
+            error, self.error = self.error, None
+            raise error
+        if self.eof:
+            return b""
+        if self.thread is None:
+            # Start background thread
+            self.queue  = queue.Queue(GZIP_QUEUE_SIZE)
+            self.stopev = threading.Event()
+            self.thread = threading.Thread(target=self._prefetch, args=(self.queue, self.stopev))
+            self.thread.daemon = True
+            self.thread.start()
+        data = self.queue.get()
+        if isinstance(data, Exception) or not data:
+            # Thread is done
+            self.thread.join()
+            self.thread = None
+            # Do not start another thread on the same stream after an
+            # error, any further reads just return end of file
+            self.eof = True
+            if data:
+                raise data
+        return data
+
+    def read(self, size=-1):
+        """Read and return up to size bytes, all bytes until the end of
+           the file are returned if size is negative
+        """
+        parts = []
+        while True:
+            avail = len(self.buffer) - self.boffset
+            if size >= 0 and avail >= size:
+                end = self.boffset + size
+                parts.append(self.buffer[self.boffset:end])
+                self.boffset = end
+                break
+            parts.append(self.buffer[self.boffset:])
+            size -= avail
+            self.boffset = 0
+            try:
+                self.buffer = self._next_chunk()
+            except Exception as error:
+                self.buffer = b""
+                if not any(parts):
+                    raise
+                # Return the data read so far,
+                # the error is raised on the next read
+                self.error = error
+            if not self.buffer:
+                break
+        data = b"".join(parts)
+        self.position += len(data)
+        return data
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        """Change the position of the uncompressed stream"""
+        if whence == os.SEEK_CUR:
+            offset += self.position
+        elif whence != os.SEEK_SET:
+            raise ValueError("Seek from end not supported")
+        self._stop()
+        self.gzfh.seek(offset)
+        self.position = self.gzfh.tell()
+        self.eof = False
+        self.error = None
+        return self.position
+
+    def tell(self):
+        """Return the position of the uncompressed stream"""
+        return self.position
+
+    def close(self):
+        """Stop the background thread and close the file"""
+        self._stop()
+        self.gzfh.close()
+
 class Header(BaseObj):
     # Class attributes
     _attrlist = ("major", "minor", "zone_offset", "accuracy",
                  "dump_length", "link_type")
 
     def __init__(self, pktt):
-        ulist = struct.unpack(pktt.header_fmt, pktt._read(20))
+        ulist = pktt._read_unpack(pktt.header_struct)
+        if ulist is None:
+            raise Exception("Packet trace file header is truncated")
         self.major       = ulist[0]
         self.minor       = ulist[1]
         self.zone_offset = ulist[2]
@@ -328,6 +663,7 @@ class Pktt(BaseObj):
         self.tfile   = tfile  # Current trace file name
         self.bfile   = tfile  # Base trace file name
         self.live    = live   # Set to True if dealing with a live tcpdump file
+        self.livewait = LIVE_WAIT_MIN # Time to wait for data on a live file
         self.offset  = 0      # Current file offset
         self.boffset = -1     # File offset of current packet
         self.ioffset = 0      # File offset of first packet
@@ -345,8 +681,10 @@ class Pktt(BaseObj):
         self.pkt_call  = None # The current packet call if self.pkt is a reply
         self.pktt_list = []   # List of Pktt objects created
         self.tfiles    = []   # List of packet trace files
-        self.rdbuffer  = b""  # Read buffer
+        self.pktt_pq   = None # Priority queue of packet trace objects
+        self.rdbuffer  = bytearray() # Read buffer
         self.rdoffset  = 0    # Read buffer offset
+        self.mmap      = None # Memory map of the trace file
         self.filesize  = 0    # Size of packet trace file
         self.prevprog  = -1.0 # Previous progress percentage
         self.prevtime  = 0.0  # Previous segment time
@@ -354,6 +692,10 @@ class Pktt(BaseObj):
         self.prevoff   = 0    # Previous offset
         self.showprog  = 0    # If this is true the progress will be displayed
         self.progdone  = 0    # Display last progress only once
+        self.progtime  = 0.0  # Time of last terminal check for progress
+        self.progfg    = False # Running on the foreground of the terminal
+        self.progcols  = 0    # Number of columns of the terminal
+        self.progline  = None # Last progress line displayed
         self.maxindex  = None # Global maxindex default
         self.timestart = time.time() # Time reference base
         self.reply_matched = False   # Matching a reply
@@ -400,6 +742,9 @@ class Pktt(BaseObj):
         # Cleanup is done just once
         self._cleanup_done = True
 
+        if self.mmap is not None:
+            self.mmap.close()
+            self.mmap = None
         if self.fh:
             # Close packet trace
             self.fh.close()
@@ -410,15 +755,17 @@ class Pktt(BaseObj):
                 pktt.close()
 
         # Cleanup object attributes to release memory
-        del self.pkt
-        del self.pktlist
-        del self.rdbuffer
-        del self.pktt_list
-        del self.pkt_call
-        del self._match_xid_list
-        del self._tcp_stream_map
-        del self._rpc_xid_map
-        del self._rdma_info
+        self._tcp_stream_map.clear()
+        self._ipv4_fragments.clear()
+        self._rpc_xid_map.clear()
+        self._match_xid_list.clear()
+        self.rdbuffer  = bytearray()
+        self.pkt       = None
+        self.pktlist   = None
+        self.pkt_call  = None
+        self.pktt_list = []
+        self.pktt_pq   = None
+        self._rdma_info = None
 
     def __del__(self):
         """Destructor
@@ -520,35 +867,42 @@ class Pktt(BaseObj):
                Supports only single active iteration
         """
         self.dprint('PKT4', ">>> %d: next()" % self.index)
-        # Initialize next packet
-        self.pkt = Pkt()
 
         if len(self.pktt_list) > 1:
             # Dealing with multiple trace files
-            minsecs  = None
-            pktt_obj = None
-            for obj in self.pktt_list:
-                if obj.pkt is None:
-                    # Get first packet for this packet trace object
-                    try:
-                        next(obj)
-                    except StopIteration:
-                        obj.mindex = self.index
-                if obj.eof:
-                    continue
-                if minsecs is None or obj.pkt.record.secs < minsecs:
-                    minsecs = obj.pkt.record.secs
-                    pktt_obj = obj
+            pktt_pq = self.pktt_pq
+            if pktt_pq is None:
+                # Create the priority queue of all packet trace objects
+                # ordered by the timestamp of their current packet, the
+                # object index is used to keep the order of the list on
+                # packets having the same timestamp
+                pktt_pq = []
+                for idx, obj in enumerate(self.pktt_list):
+                    if obj.pkt is None:
+                        # Get first packet for this packet trace object
+                        try:
+                            next(obj)
+                        except StopIteration:
+                            obj.mindex = self.index
+                    if not obj.eof:
+                        pktt_pq.append((obj.pkt.record.secs, idx, obj))
+                heapq.heapify(pktt_pq)
+            # The priority queue is not valid until the packet trace
+            # object is added back to the queue
+            self.pktt_pq = None
             if self.filesize == 0:
                 # Calculate total bytes to process
                 for obj in self.pktt_list:
                     self.filesize += obj.filesize
-            if pktt_obj is None:
+            if len(pktt_pq) == 0:
                 # All packet trace files have been processed
+                self.pkt = Pkt()
                 self.offset = self.filesize
                 self.show_progress(True)
                 raise StopIteration
-            elif len(self._tcp_stream_map) or len(self._rdma_info):
+            # Packet trace object with the oldest packet
+            secs, pidx, pktt_obj = heapq.heappop(pktt_pq)
+            if len(self._tcp_stream_map) or len(self._rdma_info):
                 # This packet trace file should be processed serially
                 # Have all state transferred to next packet object
                 pktt_obj.rewind()
@@ -596,38 +950,50 @@ class Pktt(BaseObj):
                     self._tcp_stream_map = pktt_obj._tcp_stream_map
                     self._rpc_xid_map    = pktt_obj._rpc_xid_map
                     self._rdma_info      = pktt_obj._rdma_info
+            if not pktt_obj.eof:
+                # Add packet trace object back to the queue using the
+                # timestamp of its next packet
+                heapq.heappush(pktt_pq, (pktt_obj.pkt.record.secs, pidx, pktt_obj))
+            self.pktt_pq = pktt_pq
 
-            self.show_progress()
+            if self.showprog:
+                self.show_progress()
 
             # Increment cumulative packet index
             self.index += 1
             return self.pkt
 
-        if self.boffset != self.offset:
-            # Frame number is one for every record header on the pcap trace
-            # On the other hand self.index is the packet number. Since there
-            # could be multiple packets on a single frame self.index could
-            # be larger than self.frame except that self.index start at 0
-            # while self.frame starts at 1.
-            # The frame number can be used to match packets with other tools
-            # like wireshark
-            self.frame += 1
-            self.dframe = 1
-        else:
-            self.dframe = 0
+        # Initialize next packet, the packet object is not reused since
+        # the caller may keep a reference to it, e.g., match() results
+        self.pkt = Pkt()
+
+        # Frame number is one for every record header on the pcap trace
+        # On the other hand self.index is the packet number. Since there
+        # could be multiple packets on a single frame self.index could
+        # be larger than self.frame except that self.index start at 0
+        # while self.frame starts at 1.
+        # The frame number can be used to match packets with other tools
+        # like wireshark
+        # Increment the frame number only when the file offset changed,
+        # dframe is set to 1 if it was incremented or to 0 otherwise
+        self.dframe = int(self.boffset != self.offset)
+        self.frame += self.dframe
 
         # Save file offset for this packet
         self.boffset = self.offset
 
-        # Get record header
-        data = self._read(16)
-        if len(data) < 16:
+        # Open packet trace if needed
+        self._getfh()
+
+        # Get and unpack record header
+        ulist = self._read_unpack(self.record_struct)
+        if ulist is None:
             self.eof = True
             self.offset = self.filesize
             self.show_progress(True)
             raise StopIteration
         # Decode record header
-        record = Record(self, data)
+        record = Record(self, ulist=ulist)
 
         # Get record data and create Unpack object
         self.unpack = Unpack(self._read(record.length_inc))
@@ -638,34 +1004,15 @@ class Pktt(BaseObj):
             self.show_progress(True)
             raise StopIteration
 
-        if self.header.link_type == 1:
-            # Decode ethernet layer
-            ETHERNET(self)
-        elif self.header.link_type == 101:
-            # Decode raw ip layer
-            uoffset = self.unpack.tell()
-            ipver = self.unpack.unpack_uchar()
-            self.unpack.seek(uoffset)
-            if (ipver >> 4) == 4:
-                # Decode IPv4 packet
-                IPv4(self)
-            elif (ipver >> 4) == 6:
-                # Decode IPv6 packet
-                IPv6(self)
-        elif self.header.link_type == 113:
-            # Decode Linux "cooked" v1 capture encapsulation layer
-            SLLv1(self)
-        elif self.header.link_type == 276:
-            # Decode Linux "cooked" v2 capture encapsulation layer
-            SLLv2(self)
-        elif self.header.link_type == 197:
-            # Decode extensible record format layer
-            ERF(self)
+        if self.link_decoder is not None:
+            # Decode link layer
+            self.link_decoder(self)
         else:
             # Unknown link layer
             record.data = self.unpack.getbytes()
 
-        self.show_progress()
+        if self.showprog:
+            self.show_progress()
 
         # Increment packet index
         self.index += 1
@@ -687,6 +1034,9 @@ class Pktt(BaseObj):
                 # Dealing with multiple trace files
                 self.index = 0
                 self.frame = 0
+                # Packet trace objects are rewound so the priority
+                # queue must be created again
+                self.pktt_pq = None
                 for obj in self.pktt_list:
                     if not obj.eof or index <= obj.mindex:
                         obj.rewind()
@@ -729,10 +1079,18 @@ class Pktt(BaseObj):
            If new position is outside the current read buffer then clear the
            buffer so a new chunk of data will be read from the file instead
         """
+        if self.mmap is not None:
+            # Trace file is memory mapped, just set the new offset
+            if whence == os.SEEK_CUR:
+                offset += self.offset
+            elif whence == os.SEEK_END:
+                offset += len(self.mmap)
+            self.offset = max(0, offset)
+            return
         soffset = self.fh.tell() - len(self.rdbuffer)
         if hard or offset < soffset or whence != os.SEEK_SET:
             # Seek is before the read buffer, do the actual seek
-            self.rdbuffer = b""
+            self.rdbuffer = bytearray()
             self.rdoffset = 0
             self.fh.seek(offset, whence)
             self.offset = self.fh.tell()
@@ -750,9 +1108,20 @@ class Pktt(BaseObj):
                 raise Exception("Packet trace file is empty")
 
             # Open trace file
-            self.fh = open(self.tfile, 'rb')
+            self.fh = open(self.tfile, 'rb', buffering=OPEN_BUFFER_SIZE)
             self.filesize = fstat.st_size
 
+            if not self.live:
+                # Memory map the trace file so there is no need to read
+                # the file in chunks, let the kernel do the read ahead.
+                # A live trace is not mapped since the file is growing
+                try:
+                    self.mmap = mmap.mmap(self.fh.fileno(), 0, access=mmap.ACCESS_READ)
+                    if hasattr(self.mmap, "madvise"):
+                        self.mmap.madvise(mmap.MADV_SEQUENTIAL)
+                except (OSError, ValueError):
+                    self.mmap = None
+
             iszip = False
             self.header_fmt = None
             while self.header_fmt is None:
@@ -777,6 +1146,10 @@ class Pktt(BaseObj):
                     if iszip:
                         raise Exception('Not a tcpdump file')
                     iszip = True
+                    if self.mmap is not None:
+                        # Compressed file must be read through the file object
+                        self.mmap.close()
+                        self.mmap = None
                     # Get the size of the uncompressed file, this only works
                     # for uncompressed files less than 4GB
                     self.fh.seek(-4, os.SEEK_END)
@@ -784,10 +1157,16 @@ class Pktt(BaseObj):
                     # Do a hard seek -- clear read ahead buffer
                     self.seek(0, hard=True)
                     # Try if this is a gzip compress file
-                    self.fh = gzip.GzipFile(fileobj=self.fh)
+                    self.fh = GzipReader(self.fh)
+
+            # Compile the header and record formats just once
+            self.header_struct = struct.Struct(self.header_fmt)
+            self.record_struct = struct.Struct(self.header_rec)
 
             # Get header information
             self.header = Header(self)
+            # Link layer decoder, None for an unknown link layer
+            self.link_decoder = _LINK_DECODERS.get(self.header.link_type)
 
             # Initialize packet number
             self.index   = 0
@@ -803,6 +1182,11 @@ class Pktt(BaseObj):
         """
         # Open packet trace if needed
         self._getfh()
+        if self.mmap is not None:
+            # Get the bytes directly from the memory mapped file
+            data = self.mmap[self.offset:self.offset+count]
+            self.offset += len(data)
+            return data
         while True:
             # Get the number of bytes specified
             rdsize = len(self.rdbuffer) - self.rdoffset
@@ -814,12 +1198,14 @@ class Pktt(BaseObj):
                     # new read offset is right at the middle of the buffer
                     # This is done in case there is a seek behind the current
                     # offset so data is not read from the file again
-                    self.rdbuffer = self.rdbuffer[self.rdoffset-READ_SIZE:]
+                    # The read buffer is modified in place
+                    del self.rdbuffer[:self.rdoffset-READ_SIZE]
                     self.rdoffset = READ_SIZE
                 # Read next chunk from file
                 self.rdbuffer += self.fh.read(max(count, READ_SIZE))
-            # Get the bytes requested and increment read offset accordingly
-            data = self.rdbuffer[self.rdoffset:self.rdoffset+count]
+            # Get the bytes requested and increment read offset accordingly,
+            # use a memory view so the bytes are copied just once
+            data = bytes(memoryview(self.rdbuffer)[self.rdoffset:self.rdoffset+count])
             self.rdoffset += count
 
             ldata = len(data)
@@ -839,14 +1225,47 @@ class Pktt(BaseObj):
                     self.findex = findex
                 # Re-position file pointer to last known offset
                 self.seek(self.offset)
-                time.sleep(1)
+                time.sleep(self.livewait)
+                self.livewait = min(2*self.livewait, LIVE_WAIT_MAX)
             else:
                 break
 
+        if self.live:
+            # Data is available, wait the minimum time on next <EOF>
+            self.livewait = LIVE_WAIT_MIN
+
         # Increment object's offset by the amount of data read
         self.offset += ldata
         return data
 
+    def _read_unpack(self, sobj):
+        """Read and unpack the next sobj.size bytes from the trace file,
+           returns None if there is not enough data. The data is unpacked
+           directly from the read buffer without creating an intermediate
+           bytes object when all bytes needed are already in the buffer.
+
+           sobj:
+               struct.Struct object used to unpack the data
+        """
+        size = sobj.size
+        if self.mmap is not None:
+            offset = self.offset
+            if len(self.mmap) - offset >= size:
+                self.offset = offset + size
+                return sobj.unpack_from(self.mmap, offset)
+            # Skip to the end of the file
+            self._read(size)
+            return None
+        rdoffset = self.rdoffset
+        if self.fh is not None and len(self.rdbuffer) - rdoffset >= size:
+            self.rdoffset = rdoffset + size
+            self.offset  += size
+            return sobj.unpack_from(self.rdbuffer, rdoffset)
+        data = self._read(size)
+        if len(data) < size:
+            return None
+        return sobj.unpack(data)
+
     def get_index(self):
         """Get current packet index"""
         if self.pktlist is None:
@@ -871,7 +1290,8 @@ class Pktt(BaseObj):
         """Clear list of outstanding xids"""
         self._match_xid_list = []
 
-    def _convert_match(self, matchstr, astout=False):
+    @classmethod
+    def _convert_match(cls, matchstr, astout=False):
         """Convert a string match expression into a valid match expression
            to be evaluated by eval(). All items specified as valid packet
            layers are replaced with a call to the correct wrapper function.
@@ -926,17 +1346,36 @@ class Pktt(BaseObj):
             # Process logical operators ("and", "or")
             for idx in range(len(tree.values)):
                 subexpr = tree.values[idx]
-                tree.values[idx] = self._convert_match(subexpr, True)
+                tree.values[idx] = cls._convert_match(subexpr, True)
         else:
             raise Exception("%r should be a comparison, function call or unary operation" % unparse(tree))
 
         return (tree if astout else unparse(tree))
 
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _compile_match(matchstr):
+        """Return the function for the converted match expression, it
+           takes the object and the packet as arguments. The result is
+           cached so the match expression is parsed, converted and
+           compiled only once.
+        """
+        # The converted tree is compiled as the body of the function
+        # instead of converting it back to a string to be parsed again
+        func = ast.parse("lambda self, pkt: None", mode="eval")
+        func.body.body = Pktt._convert_match(matchstr, True)
+        layers = _match_layers(func.body.body)
+        code = compile(ast.fix_missing_locations(func), "<match>", "eval")
+        pmatch = eval(code, _MATCH_GLOBALS)
+        # Packet layers needed for the match expression to be true
+        pmatch.layers = frozenset(layers) if layers else None
+        return pmatch
+
     def match_pkt(self, expr):
         """Default wrapper function to evaluate a simple string expression."""
         ret = False
         try:
-            ret = eval(expr)
+            ret = _compile_pkt_func(expr)(self)
         except:
             pass
 
@@ -1013,28 +1452,20 @@ class Pktt(BaseObj):
         """
         ret = False
         try:
-            if self.pkt.rpc.version == 3:
+            if "nfs" not in self.pkt._layerset:
+                # Not an NFS packet, avoid raising an exception
+                pass
+            elif self.pkt.rpc.version == 3:
                 # NFSv3 packet set nfs object
                 nfs = self.pkt.nfs
-                if eval(expr):
+                if _compile_func(expr, "self, nfs")(self, nfs):
                     # Set NFSop and NFSidx
                     self._nfsop  = nfs
                     self._nfsidx = None
                     ret = True
             else:
-                idx = 0
                 # NFSv4 packet, nfs object is each item in the array
-                for nfs in self.pkt.nfs.array:
-                    try:
-                        if eval(expr):
-                            self._nfsop  = nfs
-                            self._nfsidx = idx
-                            ret = True
-                            continue
-                    except Exception:
-                        # Continue searching on next operation
-                        pass
-                    idx += 1
+                ret = _compile_nfs_array(expr)(self, self.pkt.nfs.array)
         except:
             pass
 
@@ -1048,7 +1479,9 @@ class Pktt(BaseObj):
            to the packet at the beginning of the search.
 
            expr:
-               String of expressions to be evaluated
+               String of expressions to be evaluated or a match function
+               which takes the object and the packet as arguments,
+               e.g., the function returned by match_flow()
            maxindex:
                The match fails if packet index hits this limit
            rewind:
@@ -1120,8 +1553,13 @@ class Pktt(BaseObj):
            See also:
                match_ethernet(), match_ip(), match_tcp(), match_rpc(), match_nfs()
         """
-        # Parse match expression
-        pdata = self._convert_match(expr)
+        if callable(expr):
+            # Match function is given, no need to parse anything
+            pmatch = expr
+            expr = getattr(expr, "expr", expr)
+        else:
+            # Parse match expression
+            pmatch = self._compile_match(expr)
         self.reply_matched = False
         if self.pktlist is None:
             pkt_list   = self
@@ -1137,16 +1575,27 @@ class Pktt(BaseObj):
             # Use global max index as default
             maxindex = self.maxindex
 
+        # Packets not having all the layers needed by the match expression
+        # are skipped without evaluating it, unless the expression is being
+        # debugged since then every evaluation is displayed
+        layers = getattr(pmatch, "layers", None)
+        if layers is not None and self.dprint_enabled('PKT3'):
+            layers = None
+
+        # Matching from the packet list instead of the trace file
+        buffered = self.pktlist is not None
+
         # Search one packet at a time
         for pkt in pkt_list:
-            if maxindex and pkt.record.index >= maxindex:
-                # Hit maxindex limit
-                break
-            if self.pktlist is not None:
-                if pkt.record.index < self.pindex:
-                    continue
-                else:
-                    self.pindex = pkt.record.index + 1
+            if maxindex or buffered:
+                index = pkt.record.index
+                if maxindex and index >= maxindex:
+                    # Hit maxindex limit
+                    break
+                if buffered:
+                    if index < self.pindex:
+                        continue
+                    self.pindex = index + 1
                     self.pkt = pkt
             try:
                 if reply and pkt == "rpc" and pkt.rpc.type == 1 and pkt.rpc.xid in self._match_xid_list:
@@ -1155,7 +1604,7 @@ class Pktt(BaseObj):
                     self.reply_matched = True
                     self.dprint('PKT2', "    %s" % pkt)
                     return pkt
-                if eval(pdata):
+                if (layers is None or layers <= pkt._layerset) and pmatch(self, pkt):
                     # Return matched packet
                     self.dprint('PKT1', ">>> %d: match() -> True" % pkt.record.index)
                     if reply and pkt == "rpc" and pkt.rpc.type == 0:
@@ -1178,9 +1627,19 @@ class Pktt(BaseObj):
 
     def show_progress(self, done=False):
         """Display progress bar if enabled and if running on correct terminal"""
-        if SHOWPROG and self.showprog and (done or self.index % 500 == 0) \
-          and (os.getpgrp() == os.tcgetpgrp(sys.stderr.fileno())):
-            rows, columns = struct.unpack('hh', fcntl.ioctl(2, termios.TIOCGWINSZ, "1234"))
+        if SHOWPROG and self.showprog and (done or self.index % 500 == 0):
+            xtime = time.time()
+            if done or xtime - self.progtime >= 1.0:
+                # Check the terminal at most once a second, this includes
+                # checking if the terminal has been resized
+                self.progtime = xtime
+                self.progfg = (os.getpgrp() == os.tcgetpgrp(sys.stderr.fileno()))
+                if self.progfg:
+                    self.progcols = os.get_terminal_size(2).columns
+            if not self.progfg:
+                # Not running on the foreground of the terminal
+                return
+            columns = self.progcols
             if columns < 100:
                 sps = 40
             else:
@@ -1190,7 +1649,6 @@ class Pktt(BaseObj):
             wlen = int(columns) - sps
             # Progress bar units done so far
             xdone = int(wlen*self.offset/self.filesize)
-            xtime = time.time()
             progress = 100.0*self.offset/self.filesize
 
             # Display progress only if there is some change in progress
@@ -1222,12 +1680,16 @@ class Pktt(BaseObj):
                 # processed so far relative to the total number of bytes
                 pbar += "%5.1f%% %9s/%-9s" % (progress, str_units(self.offset), str_units(self.filesize))
                 if columns < 100:
-                    sys.stderr.write("%s %8s\r" % (pbar, str_time(otime)))
+                    line = "%s %8s\r" % (pbar, str_time(otime))
                 else:
                     # Terminal is wide enough, include bytes/sec
-                    sys.stderr.write("%s %9s/s %8s\r" % (pbar, str_units(bps), str_time(otime)))
+                    line = "%s %9s/s %8s\r" % (pbar, str_units(bps), str_time(otime))
                 if done:
-                    sys.stderr.write("\n")
+                    sys.stderr.write(line + "\n")
+                elif line != self.progline:
+                    # Do not write the same progress line again
+                    sys.stderr.write(line)
+                self.progline = line
 
     @staticmethod
     def escape(data):
@@ -1241,6 +1703,10 @@ class Pktt(BaseObj):
                escaped_data = Pktt.escape(data)
         """
         isbytes = isinstance(data, bytes)
+        if isbytes and 0x27 not in data and 0x22 not in data:
+            # There are no quotes to escape, just strip the bytes marker
+            # and the quotes added by repr()
+            return repr(data)[2:-1]
         # repr() can escape or not a single quote depending if a double
         # quote is present, just make sure both quotes are escaped correctly
         rdata = repr(data)
@@ -1301,6 +1767,50 @@ class Pktt(BaseObj):
             ret += " and TCP.dst_port == %d" % port
         return ret
 
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def match_flow(src=None, sport=None, dst=None, dport=None):
+        """Return a match function to find a packet coming from src:sport
+           and/or going to dst:dport. The function can be given to match()
+           instead of a match expression and it is cached so the same
+           function is returned for the same arguments.
+
+           src:
+               Source IP address [default: None]
+           sport:
+               Source TCP port [default: None]
+           dst:
+               Destination IP address [default: None]
+           dport:
+               Destination TCP port [default: None]
+
+           Examples:
+               # Same as x.match(x.ip_tcp_src_expr('192.168.1.50', 2049))
+               pkt = x.match(x.match_flow('192.168.1.50', 2049))
+
+               # Find all packets going to 192.168.1.50:2049
+               flow = Pktt.match_flow(dst='192.168.1.50', dport=2049)
+               while x.match(flow):
+                   print x.pkt.tcp
+        """
+        exprlist = []
+        if src is not None:
+            exprlist.append(Pktt.ip_tcp_src_expr(src, sport))
+        if dst is not None:
+            exprlist.append(Pktt.ip_tcp_dst_expr(dst, dport))
+
+        def flow(self, pkt):
+            if src is not None:
+                if pkt.ip.src != src or (sport is not None and pkt.tcp.src_port != sport):
+                    return False
+            if dst is not None:
+                if pkt.ip.dst != dst or (dport is not None and pkt.tcp.dst_port != dport):
+                    return False
+            return True
+        # Match expression equivalent to this function
+        flow.expr = " and ".join(exprlist)
+        return flow
+
 if __name__ == '__main__':
     # Self test of module
     l_escape = [
@@ -1314,7 +1824,7 @@ if __name__ == '__main__':
         'single\'double"back`quote',
         'double"single\'back`quote',
     ]
-    ntests = 2*len(l_escape)
+    ntests = 4*len(l_escape)
 
     tcount = 0
     for quote in ["'", '"']:
@@ -1322,6 +1832,11 @@ if __name__ == '__main__':
             expr = "data == %s%s%s" % (quote, Pktt.escape(data), quote)
             if eval(expr):
                 tcount += 1
+            # Test escaping bytes as well
+            bdata = data.encode()
+            expr = "bdata == b%s%s%s" % (quote, Pktt.escape(bdata), quote)
+            if eval(expr):
+                tcount += 1
 
     if tcount == ntests:
         print("All tests passed!")
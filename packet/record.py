@@ -18,7 +18,6 @@ Provides the object for a record and the string representation of the record
 in a tcpdump trace file.
 """
 import time
-import struct
 import nfstest_config as c
 from baseobj import BaseObj
 
@@ -40,6 +39,9 @@ class Record(BaseObj):
 
            x = Record(pktt, data)
 
+           # Record header already unpacked
+           x = Record(pktt, ulist=ulist)
+
        Object definition:
 
        Record(
@@ -57,7 +59,7 @@ class Record(BaseObj):
     _attrlist = ("frame", "index", "seconds", "usecs",
                  "length_inc", "length_orig", "secs", "rsecs")
 
-    def __init__(self, pktt, data):
+    def __init__(self, pktt, data=None, ulist=None):
         """Constructor
 
            Initialize object's private data.
@@ -67,9 +69,13 @@ class Record(BaseObj):
                access to the parent layers.
            data:
                Raw packet data for this layer.
+           ulist:
+               List of record header fields already unpacked, data is
+               not used if this is given.
         """
-        # Decode record header
-        ulist = struct.unpack(pktt.header_rec, data)
+        if ulist is None:
+            # Decode record header
+            ulist = pktt.record_struct.unpack(data)
         self.frame       = pktt.frame
         self.index       = pktt.index
         self.seconds     = ulist[0]
@@ -18,6 +18,7 @@ Decode DDP layer.
 
 RFC 5041 Direct Data Placement over Reliable Transports
 """
+import struct
 import nfstest_config as c
 from baseobj import BaseObj
 from packet.utils import IntHex, LongHex
@@ -29,6 +30,12 @@ __copyright__ = "Copyright (C) 2021 NetApp, Inc."
 __license__   = "GPL v2"
 __version__   = "1.0"
 
+# DDP header: control fields, reserved for ULP and the steering tag or
+# the queue number, followed by the tagged or untagged fields
+_DDP_HDR      = struct.Struct("!BBI")
+_DDP_TAGGED   = struct.Struct("!Q")
+_DDP_UNTAGGED = struct.Struct("!3I")
+
 class DDP(BaseObj):
     """DDP object
 
@@ -72,7 +79,7 @@ class DDP(BaseObj):
         offset = unpack.tell()
 
         # Decode the DDP layer header
-        ulist = unpack.unpack(6, "!BBI")
+        ulist = unpack.unpack_struct(_DDP_HDR)
         self.tagged  = (ulist[0] >> 7) & 0x01
         self.lastfl  = (ulist[0] >> 6) & 0x01
         reserved     = (ulist[0] >> 2) & 0x0F
@@ -90,11 +97,11 @@ class DDP(BaseObj):
         if self.tagged:
             # DDP tagged messaged
             self.stag   = IntHex(ulist[2])
-            self.offset = LongHex(unpack.unpack_uint64())
+            self.offset = LongHex(unpack.unpack_struct(_DDP_TAGGED)[0])
             self._strfmt2 = "version: {2}, stag: {3}, offset: {6}, last: {1}, len: {7}"
         else:
             # DDP untagged messaged
-            ulist = unpack.unpack(12, "!3I")
+            ulist = unpack.unpack_struct(_DDP_UNTAGGED)
             self.queue  = ulist[0]
             self.msn    = ulist[1]
             self.offset = ulist[2]
@@ -119,4 +126,5 @@ class DDP(BaseObj):
         # Get the un-dissected bytes
         size = unpack.size()
         if size > 0:
-            self.data = unpack.read(size)
+            # Reference the bytes in the packet buffer instead of copying them
+            self.data = unpack.read_view(size)
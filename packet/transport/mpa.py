@@ -18,6 +18,7 @@ Decode MPA layer.
 
 RFC 5044 Marker PDU Aligned Framing for TCP Specification
 """
+import struct
 import nfstest_config as c
 from baseobj import BaseObj
 from packet.unpack import Unpack
@@ -30,6 +31,10 @@ __copyright__ = "Copyright (C) 2021 NetApp, Inc."
 __license__   = "GPL v2"
 __version__   = "1.1"
 
+# MPA Req/Rep Frame header following the key: flags, revision
+# and private data length
+_MPA_FRAME = struct.Struct("!BBH")
+
 MPA_Request_Frame = 0
 MPA_Reply_Frame   = 1
 
@@ -42,6 +47,27 @@ class FrameType(Enum):
     """enum OpCode"""
     _enumdict = mpa_frame_type
 
+# Number of padding bytes indexed by the two least significant bits of
+# the MPA length plus the two bytes of the length field itself
+_MPA_PAD = (0, 3, 2, 1)
+
+# MPA Req/Rep Frame key: (frame type, display formats), the frame type
+# objects are created once and shared by all MPA Req/Rep Frames
+_MPA_KEYS = {
+    # key = 0x4d504120494420526571204672616d65
+    b"MPA ID Req Frame": (
+        FrameType(MPA_Request_Frame),
+        "MPA   v{7:<3} {3}, marker: {4}, use_crc: {5}, len: {0}",
+        "{3}, revision: {7}, marker: {4}, use_crc: {5}, len: {0}",
+    ),
+    # key = 0x4d504120494420526570204672616d65
+    b"MPA ID Rep Frame": (
+        FrameType(MPA_Reply_Frame),
+        "MPA   v{7:<3} {3},   marker: {4}, use_crc: {5}, len: {0}, reject: {6}",
+        "{3}, revision: {7}, marker: {4}, use_crc: {5}, reject: {6}, len: {0}",
+    ),
+}
+
 class MPA(BaseObj):
     """MPA object
 
@@ -73,6 +99,9 @@ class MPA(BaseObj):
     # Class attributes
     _attrlist = ("psize", "pad", "crc",
                  "ftype", "marker", "use_crc", "reject", "revision")
+    # Store layer attributes in slots, any other attribute is still
+    # stored in the object's dictionary inherited from BaseObj
+    __slots__ = _attrlist + ("rpsize", "data", "_pkt")
     _strfmt1  = "MPA   crc: {2}, pad: {1}, len: {0}"
     _strfmt2  = "crc: {2}, pad: {1}, len: {0}"
 
@@ -87,6 +116,7 @@ class MPA(BaseObj):
         """
         unpack = pktt.unpack
         record = pktt.pkt.record
+        length_orig = record.length_orig
         offset = unpack.tell()
         self.psize = 0
         self.rpsize = 0
@@ -98,40 +128,45 @@ class MPA(BaseObj):
         self.psize = mpalen
 
         # MPA payload size: excluding the MPA CRC (4 bytes)
-        if record.length_orig < len(unpack):
+        if length_orig < len(unpack):
             # Reassembled message of TCP fragments
             size = unpack.size()
         else:
-            size = record.length_orig - unpack.tell() - 4
+            size = length_orig - unpack.tell() - 4
         # Do not include any padding
-        self.pad = ((4 - ((mpalen+2) & 0x03)) & 0x03)
-        size -= self.pad
+        pad = _MPA_PAD[(mpalen + 2) & 0x03]
+        self.pad = pad
+        size -= pad
         self.rpsize = size
 
         # Check if valid MPA layer
         # XXX FIXME This check does not include any markers
         if mpalen > size:
-            # Not an MPA Full Operation Phase packet,
-            # try if this is an MPA Connection Setup
-            self._mpa_setup(pktt, mpalen, offset)
+            # Not an MPA Full Operation Phase packet
+            if mpalen == 0x4d50:
+                # Could be the start of req/rep key: "MP",
+                # try if this is an MPA Connection Setup
+                self._mpa_setup(pktt, offset)
+            else:
+                unpack.seek(offset)
             return
 
         # This is an MPA packet
         pktt.pkt.add_layer("mpa", self)
 
         # Get the CRC only if the whole frame was captured
-        delta = record.length_orig - record.length_inc
+        delta = length_orig - record.length_inc
         size = unpack.size() - ((4-delta) if delta < 4 else 0)
-        data = bytes(0)
+        data = b""
         if size > 0:
             # Use min between mpalen and size since size could be smaller
             # than mpalen if this is a truncated frame. It could be larger
             # if there is a full capture and there is padding
             data = unpack.read(min(mpalen, size))
 
-        if self.pad and delta == 0 and unpack.size():
-            # Get padding bytes
-            unpack.read(min(self.pad, unpack.size()))
+        if pad and delta == 0 and unpack.size():
+            # Skip padding bytes, seek does not go past the end of the data
+            unpack.seek(unpack.tell() + pad)
 
         unpack_save = None
         if delta == 0 and unpack.size() >= 4:
@@ -162,36 +197,28 @@ class MPA(BaseObj):
     def _mpa_frame(self, pktt):
         """Dissect MPA Req/Rep Frame"""
         unpack = pktt.unpack
-        ulist  = unpack.unpack(4, "!BBH")
-        self.marker   = (ulist[0] >> 7) & 0x01
-        self.use_crc  = (ulist[0] >> 6) & 0x01
-        self.reject   = (ulist[0] >> 5) & 0x01
-        self.revision = ulist[1]
-        self.psize    = ulist[2]
+        flags, self.revision, self.psize = unpack.unpack_struct(_MPA_FRAME)
+        self.marker   = (flags >> 7) & 0x01
+        self.use_crc  = (flags >> 6) & 0x01
+        self.reject   = (flags >> 5) & 0x01
         self.data     = unpack.read(self.psize)
         pktt.pkt.add_layer("mpa", self)
 
-    def _mpa_setup(self, pktt, mpalen, offset):
-        """Dissect MPA Connection Setup"""
+    def _mpa_setup(self, pktt, offset):
+        """Dissect MPA Connection Setup, the MPA length has already been
+           checked to be the start of the req/rep key: "MP"
+        """
         unpack = pktt.unpack
-        if mpalen == 0x4d50: # Could be the start of req/rep key: "MP"
+        # The key should be followed by "A ", the next two bytes are
+        # checked before reading the whole key
+        if unpack.unpack_ushort() == 0x4120:
             # Check if this is an MPA Request or Reply frame
             unpack.seek(offset)
-            key = unpack.read(16)
-            if key == b"MPA ID Req Frame":
-                # MPA Request Frame
-                # key = 0x4d504120494420526571204672616d65
-                self._mpa_frame(pktt)
-                self.ftype    = FrameType(MPA_Request_Frame)
-                self._strfmt1 = "MPA   v{7:<3} {3}, marker: {4}, use_crc: {5}, len: {0}"
-                self._strfmt2 = "{3}, revision: {7}, marker: {4}, use_crc: {5}, len: {0}"
-            elif key == b"MPA ID Rep Frame":
-                # MPA Reply Frame
-                # key = 0x4d504120494420526570204672616d65
+            entry = _MPA_KEYS.get(unpack.read(16))
+            if entry is not None:
+                # MPA Request or Reply Frame
                 self._mpa_frame(pktt)
-                self.ftype    = FrameType(MPA_Reply_Frame)
-                self._strfmt1 = "MPA   v{7:<3} {3},   marker: {4}, use_crc: {5}, len: {0}, reject: {6}"
-                self._strfmt2 = "{3}, revision: {7}, marker: {4}, use_crc: {5}, reject: {6}, len: {0}"
-        if self.ftype is None:
-            # No MPA Req/Rep Frame
-            unpack.seek(offset)
+                self.ftype, self._strfmt1, self._strfmt2 = entry
+                return
+        # No MPA Req/Rep Frame
+        unpack.seek(offset)
@@ -17,6 +17,7 @@ RDMA reassembly module
 Provides functionality to reassemble RDMA fragments.
 """
 import nfstest_config as c
+from bisect import bisect_right, insort
 from packet.utils import RDMAbase
 
 # Module constants
@@ -42,6 +43,7 @@ class RDMAseg(object):
         self.epsn     = epsn   # Last PSN in sub-segment
         self.dmalen   = dmalen # DMA length in sub-segment
         self.fraglist = []     # List of data fragments
+        self.size     = 0      # Data size of all fragments
 
     def __del__(self):
         """Destructor"""
@@ -58,34 +60,30 @@ class RDMAseg(object):
             if index < nlen:
                 # This is an out-of-order fragment,
                 # replace fragment data at index
+                self.size += len(data) - len(fraglist[index])
                 fraglist[index] = data
             else:
                 # Some fragments may be missing
-                for i in range(index - nlen):
+                if index > nlen:
                     # Use an empty string for missing fragments
                     # These may come later as out-of-order fragments
-                    fraglist.append(b"")
+                    fraglist.extend([b""] * (index - nlen))
                 fraglist.append(data)
+                self.size += len(data)
             return True
         return False
 
     def get_data(self, padding=True):
         """Return sub-segment data"""
-        data = b""
         # Get data from all fragments
-        for fragdata in self.fraglist:
-            data += fragdata
+        data = b"".join(self.fraglist)
         if not padding and len(data) > self.dmalen:
             return data[:self.dmalen-len(data)]
         return data
 
     def get_size(self):
         """Return sub-segment data size"""
-        size = 0
-        # Get the size from all fragments
-        for fragdata in self.fraglist:
-            size += len(fragdata)
-        return size
+        return self.size
 
 class RDMAsegment(object):
     """RDMA segment object
@@ -102,6 +100,7 @@ class RDMAsegment(object):
         self.rpcrdma = rpcrdma # RPC-over-RDMA object used for RDMA reads
         self.rhandle = None    # Sink Steering Tag in iWarp request
         self.fragments = {}    # List of iWarp data fragments
+        self.fragsize  = None  # Size of iWarp fragments, None if not known
 
         # List of sub-segments (RDMAseg)
         # When the RDMA segment's length (DMA length) is large it could be
@@ -110,29 +109,41 @@ class RDMAsegment(object):
         # specifies the same RKey(or handle) for all sub-segments and the
         # DMA length for the sub-segment.
         self.seglist = []
+        # Sorted list of the first PSN of all sub-segments and the mapping
+        # of the first PSN to its sub-segment, used for searching the
+        # sub-segment for a given PSN
+        self.spsnlist = []
+        self.spsnmap  = {}
 
     def __del__(self):
         """Destructor"""
         self.fragments.clear()
         self.seglist.clear()
+        self.spsnmap.clear()
+
+    def get_sub_segment(self, psn):
+        """Return the sub-segment for the given psn, None if the psn
+           is not valid for this segment
+        """
+        # The PSN ranges of the sub-segments do not overlap so the only
+        # sub-segment which could have this psn is the one having the
+        # largest first PSN which is not greater than the given psn
+        index = bisect_right(self.spsnlist, psn)
+        if index > 0:
+            seg = self.spsnmap[self.spsnlist[index-1]]
+            if psn <= seg.epsn:
+                # Correct sub-segment found
+                return seg
+        return None
 
     def valid_psn(self, psn):
         """True if given psn is valid for this segment"""
-        # Search all sub-segments
-        for seg in self.seglist:
-            if psn >= seg.spsn and psn <= seg.epsn:
-                # Correct sub-segment found
-                return True
-        return False
+        return self.get_sub_segment(psn) is not None
 
     def add_sub_segment(self, psn, dmalen, only=False, iosize=0):
         """Add RDMA sub-segment PSN information"""
-        seg = None
         # Find if sub-segment already exists
-        for item in self.seglist:
-            if psn == item.spsn:
-                seg = item
-                break
+        seg = self.spsnmap.get(psn)
         if seg:
             # Sub-segment already exists, just update epsn
             if only:
@@ -163,48 +174,58 @@ class RDMAsegment(object):
                     epsn = psn + int(dmalen/iosize) - 1 + (1 if dmalen%iosize else 0)
             seg = RDMAseg(psn, epsn, dmalen)
             self.seglist.append(seg)
+            self.spsnmap[psn] = seg
+            insort(self.spsnlist, psn)
         return seg
 
     def add_data(self, psn, data):
         """Add Infiniband fragment data"""
         # Search for correct sub-segment
-        for seg in self.seglist:
-            if seg.insert_data(psn, data):
-                # The insert_data method returns True on correct
-                # sub-segment for given psn
-                return
+        seg = self.get_sub_segment(psn)
+        if seg is not None:
+            seg.insert_data(psn, data)
 
     def get_data(self, padding=True):
         """Return segment data"""
         data = b""
         if len(self.seglist):
-            # Get data from all sub-segments
+            # Get data from all sub-segments, the fragments are joined
+            # directly unless the sub-segment data must be truncated so
+            # the data of each sub-segment is not copied twice
+            parts = []
             for seg in self.seglist:
-                data += seg.get_data(padding)
+                if padding or seg.size <= seg.dmalen:
+                    parts.extend(seg.fraglist)
+                else:
+                    parts.append(seg.get_data(padding))
+            data = b"".join(parts)
         elif len(self.fragments):
             # Get data from all iWarp fragments
+            parts = []
             nextoff = self.offset
             for offset in sorted(self.fragments.keys()):
                 # Check for missing fragments
                 count = offset - nextoff
                 if count > 0:
                     # There are missing fragments
-                    data += bytes(count)
-                data += self.fragments[offset]
-                nextoff = offset + len(self.fragments[offset])
+                    parts.append(bytes(count))
+                fragdata = self.fragments[offset]
+                parts.append(fragdata)
+                nextoff = offset + len(fragdata)
+            data = b"".join(parts)
             if not padding and len(data) > self.length:
                 return data[:self.length-len(data)]
         return data
 
     def get_size(self):
         """Return segment data"""
-        size = 0
         if len(self.seglist):
             # Get the size from all sub-segments
-            for seg in self.seglist:
-                size += seg.get_size()
-        else:
-            # Get size from all iWarp fragments
+            return sum([seg.size for seg in self.seglist])
+        elif self.fragsize is None:
+            # Get size from all iWarp fragments, the size is saved
+            # until another fragment is added
+            size = 0
             nextoff = self.offset
             for offset in sorted(self.fragments.keys()):
                 # Check for missing fragments
@@ -214,11 +235,13 @@ class RDMAsegment(object):
                     size += count
                 size += len(self.fragments[offset])
                 nextoff = offset + len(self.fragments[offset])
-        return size
+            self.fragsize = size
+        return self.fragsize
 
     def add_fragment(self, offset, data):
         """Add iWarp fragment to segment"""
         self.fragments[offset] = data
+        self.fragsize = None
 
 class RDMArequest(object):
     """RDMA iWarp Request object"""
@@ -77,6 +77,11 @@ class Unpack(object):
            # Unpack an 'unsigned short' (2 bytes in network order)
            short_int = x.unpack(2, '!H')[0]
 
+           # Unpack using a precompiled struct object, data is unpacked
+           # directly from the working buffer without copying it first
+           SHORT = struct.Struct('!H')
+           short_int = x.unpack_struct(SHORT)[0]
+
            # Unpack different basic types
            char      = x.unpack_char()
            uchar     = x.unpack_uchar()
@@ -234,6 +239,19 @@ class Unpack(object):
             self._offset = dlen
         return buf
 
+    def read_view(self, size):
+        """Get the number of bytes given from the working buffer as a
+           memoryview into the buffer so the bytes are not copied.
+           Move the offset pointer.
+
+           size:
+               Length of data to get
+        """
+        offset = self._offset
+        buf = memoryview(self._data)[offset:offset+size]
+        self._offset = min(offset + size, len(self._data))
+        return buf
+
     def unpack(self, size, fmt):
         """Get the number of bytes given from the working buffer and process
            it according to the given format.
@@ -246,6 +264,18 @@ class Unpack(object):
         """
         return struct.unpack(fmt, self.read(size))
 
+    def unpack_struct(self, sobj):
+        """Process data from the working buffer according to the given
+           precompiled struct object and move the offset pointer.
+           Return a tuple of unpack items, see struct.Struct.unpack_from.
+
+           sobj:
+               Precompiled struct object (struct.Struct)
+        """
+        ret = sobj.unpack_from(self._data, self._offset)
+        self._offset += sobj.size
+        return ret
+
     def unpack_char(self):
         """Get a signed char"""
         return self.unpack(1, '!b')[0]